@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
 from flask import Flask, request, jsonify, Response
-import os, time, csv, re, requests, unicodedata
-from io import StringIO
+import os, sys, time, csv, re, json, requests, unicodedata, threading
+from io import TextIOWrapper
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from xml.sax.saxutils import escape as xml_escape
 
 app = Flask(__name__)
@@ -21,27 +25,99 @@ ADVISOR_E164 = os.getenv('ADVISOR_E164', '+59162723944')   # visible al usuario
 ADVISOR_WA_LINK = 'https://wa.me/{}'.format(ADVISOR_E164.replace('+',''))
 ADMIN_FORWARD_NUMBER = os.getenv('ADMIN_FORWARD_NUMBER', 'whatsapp:{}'.format(ADVISOR_E164))  # para Twilio REST
 
+# Config de Twilio resuelta una vez al importar (las variables de entorno no cambian en caliente)
+_TW_SEND_OK = bool(TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_WHATSAPP_NUMBER)
+_TW_OK = bool(_TW_SEND_OK and ADMIN_FORWARD_NUMBER)  # aviso al asesor habilitado
+_TW_URL = 'https://api.twilio.com/2010-04-01/Accounts/{}/Messages.json'.format(TWILIO_ACCOUNT_SID)
+_TW_AUTH = (TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+
 # Audio opcional para enviar al detectar interés (fallback si no hay por curso)
 AUDIO_URL = os.getenv('AUDIO_URL', '').strip()
 
+# Sesión HTTP compartida (keep-alive) para Google Sheets y Twilio.
+# Reintentos cortos solo si la conexión se cae o es rechazada; read=0 para que un timeout de
+# lectura no repita la espera completa (con timeout=15 serían ~45s, fuera de la ventana de Twilio).
+_http = requests.Session()
+_http.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=Retry(total=2, read=0, backoff_factor=0.2)))
+
+# Envíos salientes a Twilio fuera del camino de respuesta del webhook
+_EXEC = ThreadPoolExecutor(max_workers=4)
+
 # ===== Cache hoja y memoria simple por usuario =====
-_cache = {'rows': [], 't': 0.0, 'alias_idx': {}}
+# _cache no se modifica en el lugar: cada refresco arma un dict nuevo y reasigna el nombre.
+# Quien lee varias claves toma antes una referencia (c = _cache) para no mezclar dos cargas.
+# Todas las versiones salen de _build_cache; la inicial se asigna tras definir _menu_replies.
 CACHE_SECONDS = 300
+# (conexión, lectura) para bajar la hoja. Con arranque en frío la descarga ocurre dentro del webhook,
+# así que tiene que terminar antes de los 15s de Twilio; gunicorn gthread no corta hilos colgados.
+SHEET_TIMEOUT = (3.05, 10)
 
+# En memoria del proceso: gunicorn corre con un solo worker (ver Procfile) para que todas las
+# conversaciones vean el mismo _sessions; con más workers haría falta un almacén compartido.
 _sessions = {}  # { from_number: {'course': <row>, 't': <epoch>} }
 SESSION_TTL = 60*60  # 1 hora
 
+# Bajo gunicorn (gthread) varios hilos comparten _cache y _sessions; el lock ordena a quienes escriben
+_lock = threading.Lock()
+
 # ===== Encabezados requeridos (Alias es opcional) =====
-EXPECTED_HEADERS = [
+EXPECTED_HEADERS = (
     'Curso','Texto Principal','Link PDF','Fecha de Inicio','Fechas de clases','Duración','Horarios',
     'Inscripción Argentina','Inscripción Bolivia','Inscripción Chile','Inscripción Colombia',
     'Inscripción Costa Rica','Inscripción México','Inscripción Paraguay','Inscripción Perú',
     'Inscripción Uruguay','Inscripción Resto Países','FAQ'
-]
+)
+# Columnas opcionales ('' en CourseRow si la hoja no las trae)
+OPTIONAL_HEADERS = ('Alias', 'Audio', 'Modalidad', 'Metodología')
+# Lo único que se guarda de cada fila; otras columnas de la hoja se descartan al cargar
+_USED_COLUMNS = frozenset(EXPECTED_HEADERS) | frozenset(OPTIONAL_HEADERS)
 HEADER_SYNONYMS = {
     'Valor Inscripción Uruguay': 'Inscripción Uruguay',
+    'modalidad': 'Modalidad',
+    'MODALIDAD': 'Modalidad',
+    'Metodologia': 'Metodología',
+    'metodología': 'Metodología',
+    'metodologia': 'Metodología',
+    'METODOLOGÍA': 'Metodología',
+    'METODOLOGIA': 'Metodología',
 }
 
+# ===== Fila de curso =====
+PRICE_COLUMNS = [h for h in EXPECTED_HEADERS if h.startswith('Inscripción ')]
+PRICE_LABELS = {c: c.replace('Inscripción ', '') for c in PRICE_COLUMNS}  # 'Inscripción Perú' -> 'Perú'
+# atributo de CourseRow -> columna de la hoja
+_ROW_FIELDS = {
+    'curso': 'Curso', 'texto': 'Texto Principal', 'pdf': 'Link PDF',
+    'fecha_inicio': 'Fecha de Inicio', 'fechas_clases': 'Fechas de clases', 'duracion': 'Duración',
+    'horarios': 'Horarios', 'modalidad': 'Modalidad', 'metodologia': 'Metodología',
+    'faq': 'FAQ', 'alias': 'Alias', 'audio': 'Audio',
+}
+
+@dataclass(slots=True)
+class CourseRow:
+    """Un curso de la hoja; los textos ya vienen sin espacios al borde."""
+    curso: str
+    texto: str
+    pdf: str
+    fecha_inicio: str
+    fechas_clases: str
+    duracion: str
+    horarios: str
+    modalidad: str
+    metodologia: str
+    faq: str
+    alias: str
+    audio: str
+    precios: dict  # 'Inscripción <País>' -> valor
+    # Derivados, calculados al cargar la hoja
+    name_fold: str = ''
+    name_tokens: frozenset = frozenset()
+    faq_items: list = field(default_factory=list)
+    cards: dict = field(default_factory=dict)  # columna de precio -> course_card ya armado
+
+    def price(self, col):
+        return self.precios.get(col, '') or self.precios.get('Inscripción Resto Países', '')
+
 # ===== Prefijo telefónico -> columna de precio =====
 COUNTRY_PRICE_COLUMN = {
     '506': 'Inscripción Costa Rica',
@@ -54,6 +130,8 @@ COUNTRY_PRICE_COLUMN = {
     '52':  'Inscripción México',
     '51':  'Inscripción Perú',
 }
+# Largos de prefijo presentes, de mayor a menor (el más largo gana)
+_PREFIX_LENGTHS = sorted({len(p) for p in COUNTRY_PRICE_COLUMN}, reverse=True)
 # Palabras país en el texto -> columna de precio
 COUNTRY_WORD_TO_COL = {
     'argentina': 'Inscripción Argentina',
@@ -70,30 +148,51 @@ COUNTRY_WORD_TO_COL = {
     'resto': 'Inscripción Resto Países',
 }
 
+# ===== Regex precompiladas =====
+_TOKEN_RE = re.compile(r'[a-z0-9áéíóúñ]+')
+_TOKEN_FINDALL = _TOKEN_RE.findall
+_ALIAS_SPLIT_RE = re.compile(r'[\n,;|/]+')
+_INTENT_PREFIX_RE = re.compile(r'(?:info|informacion|información|precio|horarios?|pdf|modalidad|metodolog(?:ía|ia))\s+(.+)$')
+_PRECIO_RE = re.compile(r'precio\s+[a-záéíóúñ ]{3,}')
+_PAGO_RE = re.compile(r'(como|cómo|donde|dónde)\s+pago')
+_FAQ_BLOCK_RE = re.compile(r"Si preguntan:\s*(.+?)\s*Respuesta:\s*(.+?)(?=(?:\n\s*Si preguntan:)|\Z)", re.S | re.I)
+_FAQ_UTTER_SPLIT_RE = re.compile(r"\s*/\s*|\n")
+_FAQ_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_FAQ_TOKEN_FINDALL = _FAQ_TOKEN_RE.findall
+
 # ===== Utilidades =====
+# Vocales acentuadas / ñ del español -> base (igual que NFD sin diacríticos)
+_ACCENT_FOLD = str.maketrans('áéíóúàèìòùäëïöüâêîôûñ', 'aeiouaeiouaeiouaeioun')
+# Todas las marcas combinantes -> None, para quitarlas con un solo str.translate
+_COMBINING_DROP = dict.fromkeys(c for c in range(sys.maxunicode + 1) if unicodedata.combining(chr(c)))
+
 def _fold(s):
     s = (s or '').lower()
-    nf = unicodedata.normalize('NFD', s)
-    return ''.join(c for c in nf if not unicodedata.combining(c))
+    if s.isascii():
+        return s
+    s = s.translate(_ACCENT_FOLD)
+    if s.isascii():
+        return s
+    return unicodedata.normalize('NFD', s).translate(_COMBINING_DROP)
+
+_TWIML_HEAD = b"<?xml version='1.0' encoding='UTF-8'?><Response><Message>"
+_TWIML_TAIL = b"</Message></Response>"
+
+def twiml_bytes(message, media_url=None):
+    body = xml_escape(message or '').encode('utf-8')
+    if media_url:
+        body = b'<Body>' + body + b'</Body><Media>' + xml_escape(media_url).encode('utf-8') + b'</Media>'
+    return _TWIML_HEAD + body + _TWIML_TAIL
+
+def xml_response(payload):
+    return Response(payload, mimetype='application/xml')
 
 def build_twiml(message, media_url=None):
     """
     Si media_url está presente, enviamos texto + 1 adjunto (imagen/pdf/audio).
+    Las respuestas fijas se arman una vez con twiml_bytes() y se sirven con xml_response().
     """
-    if media_url:
-        xml = (
-            "<?xml version='1.0' encoding='UTF-8'?>"
-            "<Response><Message>"
-            f"<Body>{xml_escape(message or '')}</Body>"
-            f"<Media>{xml_escape(media_url)}</Media>"
-            "</Message></Response>"
-        )
-    else:
-        xml = (
-            "<?xml version='1.0' encoding='UTF-8'?>"
-            f"<Response><Message>{xml_escape(message or '')}</Message></Response>"
-        )
-    return Response(xml, mimetype='application/xml')
+    return xml_response(twiml_bytes(message, media_url))
 
 def _has_any(text, keywords):
     return any(k in text for k in keywords)
@@ -139,101 +238,221 @@ def _normalize_token(tok):
 def _rebuild_alias_index(rows):
     idx = {}
     for r in rows:
-        alias_cell = (r.get('Alias') or '').strip()
+        alias_cell = r.alias
         if not alias_cell:
             continue
-        parts = re.split(r'[\n,;|/]+', alias_cell)
+        parts = _ALIAS_SPLIT_RE.split(alias_cell)
         for a in parts:
-            a = a.strip()
+            a = _fold(a.strip())
             if not a:
-                continue
-            idx[_fold(a)] = r
+                continue  # p. ej. solo tildes sueltas: la clave vacía estaría 'in' en cualquier mensaje
+            idx[a] = r
     return idx
 
-def fetch_sheet_rows(force=False):
-    now = time.time()
-    if not force and _cache['rows'] and now - _cache['t'] < CACHE_SECONDS:
-        return _cache['rows']
-    if not SHEET_CSV_URL:
-        _cache.update({'rows': [], 't': now, 'alias_idx': {}})
-        return []
-
-    resp = requests.get(SHEET_CSV_URL, timeout=15)
-    resp.raise_for_status()
-    resp.encoding = 'utf-8'
-    reader = csv.DictReader(StringIO(resp.text))
-
-    raw_headers = reader.fieldnames or []
-    headers = [(h or '').strip().lstrip('\ufeff') for h in raw_headers]
-    headers = [HEADER_SYNONYMS.get(h, h) for h in headers]
+# Último encabezado válido como (fila cruda, col_idx); la hoja casi nunca cambia de forma entre refrescos.
+# Se reemplaza la tupla entera para que otro hilo nunca vea una mezcla.
+_header_plan = (None, None)
+
+def _resolve_headers(raw_headers):
+    """Normaliza y valida la fila de encabezados; devuelve {columna usada: índice}."""
+    global _header_plan
+    raw = tuple(raw_headers)
+    last_raw, last_idx = _header_plan
+    if raw == last_raw:
+        return last_idx
+    headers = []
+    for h in raw:
+        h = (h or '').strip().lstrip('\ufeff')
+        headers.append(HEADER_SYNONYMS.get(h, h))
 
     missing = [h for h in EXPECTED_HEADERS if h not in headers]
     if missing:
         raise ValueError('Faltan encabezados requeridos: {}. Recibido: {}'.format(missing, raw_headers))
 
+    # Solo se leen las columnas que usa el bot
+    col_idx = {h: i for i, h in enumerate(headers) if h in _USED_COLUMNS}
+    _header_plan = (raw, col_idx)
+    return col_idx
+
+def _parse_sheet(stream):
+    """Lee el CSV de la hoja (cualquier iterable de líneas) y devuelve las filas con Curso."""
+    reader = csv.reader(stream)
+    col_idx = _resolve_headers(next(reader, []))
+    curso_i = col_idx['Curso']
     rows = []
     for row in reader:
-        clean = {}
-        for k, v in row.items():
-            nk = (k or '').strip().lstrip('\ufeff')
-            nk = HEADER_SYNONYMS.get(nk, nk)
-            clean[nk] = (v or '').strip()
-        if clean.get('Curso'):
-            rows.append(clean)
-
-    _cache['rows'] = rows
-    _cache['t'] = now
-    _cache['alias_idx'] = _rebuild_alias_index(rows)
+        n = len(row)
+        if curso_i >= n or not row[curso_i].strip():
+            continue
+        vals = {h: (row[i].strip() if i < n else '') for h, i in col_idx.items()}
+        r = CourseRow(
+            precios={c: vals[c] for c in PRICE_COLUMNS},
+            **{attr: vals.get(col, '') for attr, col in _ROW_FIELDS.items()},
+        )
+        r.name_fold = _fold(r.curso)
+        r.name_tokens = _query_words(r.name_fold)
+        r.faq_items = _faq_prepare(r.faq)
+        rows.append(r)
+    return rows
+
+_refreshing = False
+
+def _refresh_worker():
+    global _refreshing
+    try:
+        fetch_sheet_rows(force=True)
+    except Exception as e:
+        print('[ERROR sheet refresh]', e)
+    finally:
+        with _lock:
+            _refreshing = False
+
+def _refresh_in_background():
+    global _refreshing
+    with _lock:
+        if _refreshing:
+            return
+        _refreshing = True
+    threading.Thread(target=_refresh_worker, daemon=True).start()
+
+def _build_cache(rows, now, etag=None, last_modified=None):
+    """Arma un _cache completo (filas + índices + respuestas precalculadas) para una carga de la hoja."""
+    cursos = [r.curso for r in rows]
+    return {
+        'rows': rows, 't': now, 'etag': etag, 'last_modified': last_modified,
+        'alias_idx': _rebuild_alias_index(rows),
+        'find_memo': (rows, {}),
+        'cursos': cursos, 'menus': _menu_replies(cursos), 'preview_json': _preview_json(cursos),
+    }
+
+def fetch_sheet_rows(force=False):
+    """
+    Con cache vencida se devuelven igual las filas viejas y se refresca en un hilo aparte;
+    solo se bloquea cuando aún no hay filas (arranque) o con force=True.
+    """
+    global _cache
+    now = time.time()
+    c = _cache
+    if not force and c['rows']:
+        if now - c['t'] >= CACHE_SECONDS:
+            _refresh_in_background()
+        return c['rows']
+    if not SHEET_CSV_URL:
+        new = _build_cache([], now)
+        with _lock:
+            _cache = new
+        return new['rows']
+
+    # GET condicional: si la hoja no cambió, 304 y se reutilizan las filas ya parseadas
+    cond = {}
+    if c['rows']:
+        if c['etag']:
+            cond['If-None-Match'] = c['etag']
+        if c['last_modified']:
+            cond['If-Modified-Since'] = c['last_modified']
+
+    # Se parsea a medida que llega la respuesta, sin armar el CSV entero en memoria
+    with _http.get(SHEET_CSV_URL, headers=cond, timeout=SHEET_TIMEOUT, stream=True) as resp:
+        if resp.status_code == 304:
+            with _lock:
+                _cache = c = dict(_cache, t=now)
+            return c['rows']
+        resp.raise_for_status()
+        etag, last_modified = resp.headers.get('ETag'), resp.headers.get('Last-Modified')
+        resp.raw.decode_content = True  # gzip/deflate del servidor
+        resp.raw.auto_close = False     # TextIOWrapper necesita leer el EOF sin que urllib3 cierre antes
+        # errors='replace' como resp.text: un byte inválido queda como U+FFFD y no tumba la carga
+        rows = _parse_sheet(TextIOWrapper(resp.raw, encoding='utf-8', errors='replace', newline=''))
+
+    new = _build_cache(rows, now, etag, last_modified)
+    with _lock:
+        _cache = new  # una sola reasignación: los lectores ven la carga vieja o la nueva, nunca una mezcla
     return rows
 
 def list_courses(rows):
-    return [r.get('Curso', '').strip() for r in rows if r.get('Curso')]
+    c = _cache
+    if rows is c['rows']:
+        return c['cursos']  # armado una vez por refresco de la hoja
+    return [r.curso for r in rows]
+
+def _preview_json(cursos):
+    """Cuerpo de /sheet_preview, serializado una vez por refresco (mismo formato que jsonify)."""
+    payload = {'ok': True, 'count': len(cursos), 'cursos': cursos}
+    return (json.dumps(payload, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
 
 # ===== Matching curso =====
-def _best_row_by_query(rows, q_fold):
-    for r in rows:
-        name = (r.get('Curso') or '').strip()
-        if name and q_fold in _fold(name):
-            return r
+def _query_words(q_fold):
+    # Palabras útiles (3+ letras, sin 'curso') de un texto ya plegado; igual para nombres y consultas
+    return frozenset(w for w in _TOKEN_FINDALL(q_fold) if len(w) >= 3 and w not in ('curso','cursos'))
+
+def _best_row_by_query(rows, q_fold, q_words=None, check_inside=True):
+    # Con unas decenas de cursos, 'in' sobre los nombres ya plegados es lo más rápido
+    if check_inside:
+        for r in rows:
+            if q_fold in r.name_fold:
+                return r
     for r in rows:
-        name = (r.get('Curso') or '').strip()
-        if name and _fold(name) in q_fold:
+        if r.name_fold in q_fold:
             return r
-    words = [w for w in re.findall(r'[a-z0-9áéíóúñ]+', q_fold) if len(w) >= 3 and w not in ('curso','cursos')]
-    words = set(words)
+    # Último recurso: coincidencia de palabras contra los tokens precalculados de cada curso
+    words = _query_words(q_fold) if q_words is None else q_words
+    if not words:
+        return None
     best, best_row = 0, None
+    top = len(words)
     for r in rows:
-        name = (r.get('Curso') or '')
-        name_tokens = [_fold(w) for w in re.findall(r'[a-z0-9áéíóúñ]+', name.lower()) if len(w) >= 3 and w not in ('curso','cursos')]
-        score = len(words & set(name_tokens))
+        score = len(words & r.name_tokens)
         if score > best:
             best, best_row = score, r
+            if best == top:
+                break  # todas las palabras coinciden; ninguna fila posterior puede superarla
     return best_row if best >= 1 else None
 
-def find_course(rows, user_text):
-    q_fold = _fold(user_text)
-    for a, r in (_cache.get('alias_idx') or {}).items():
-        if a and a in q_fold:
-            print('[ALIAS HIT]', a, '->', r.get('Curso'))
+_FIND_MEMO_MAX = 512  # mensajes distintos recordados por carga de la hoja
+
+def find_course(rows, q_fold, q_words=None):
+    """q_fold: texto ya pasado por _fold; q_words: _query_words(q_fold) si el llamador ya lo tiene."""
+    # Memo por carga de la hoja: 'hola', 'gracias', etc. se repiten y casi nunca encuentran curso.
+    # Va junto a las filas que lo llenaron, así un refresco no mezcla resultados viejos y nuevos.
+    owner, memo = _cache['find_memo']
+    if owner is not rows:
+        return _find_course(rows, q_fold, q_words)
+    try:
+        return memo[q_fold]
+    except KeyError:
+        pass
+    r = _find_course(rows, q_fold, q_words)
+    if len(memo) >= _FIND_MEMO_MAX:
+        memo.clear()
+    memo[q_fold] = r
+    return r
+
+def _find_course(rows, q_fold, q_words=None):
+    # Gana el primer alias de la hoja contenido en el mensaje; con pocos alias 'in' le gana a una regex
+    for a, r in _cache['alias_idx'].items():
+        if a in q_fold:
+            print('[ALIAS HIT]', a, '->', r.curso)
             return r
-    m = re.search(r'(?:info|informacion|información|precio|horarios?|pdf|modalidad|metodolog(?:ía|ia))\s+(.+)$', q_fold)
+    m = _INTENT_PREFIX_RE.search(q_fold)
     if m:
         cand = m.group(1).strip()
         r = _best_row_by_query(rows, cand)
         if r:
-            print('[BEST MATCH after keyword]', cand, '->', r.get('Curso'))
+            print('[BEST MATCH after keyword]', cand, '->', r.curso)
             return r
-    r = _best_row_by_query(rows, q_fold)
+    # Si 'cand' no está dentro de ningún nombre, q_fold (que lo contiene) tampoco: se salta ese paso
+    r = _best_row_by_query(rows, q_fold, q_words, check_inside=not m)
     if r:
-        print('[BEST MATCH]', q_fold, '->', r.get('Curso'))
+        print('[BEST MATCH]', q_fold, '->', r.curso)
     return r
 
 # ===== Precio por país =====
 def guess_country_price_column(from_number):
     num = (from_number or '').replace('whatsapp:', '').replace('+', '')
-    for p in sorted(COUNTRY_PRICE_COLUMN.keys(), key=lambda p: -len(p)):
-        if num.startswith(p):
-            return COUNTRY_PRICE_COLUMN[p]
+    for n in _PREFIX_LENGTHS:
+        col = COUNTRY_PRICE_COLUMN.get(num[:n])
+        if col:
+            return col
     return 'Inscripción Resto Países'
 
 def pick_price_column_from_text(body_lower, from_number):
@@ -264,16 +483,33 @@ INTENTS = {
 }
 GREETINGS = ['hola','buenas','buenos dias','buenos días','buenas tardes','buenas noches','hey','que tal','qué tal']
 
-def classify_intents(body_lower):
-    flags = {k: False for k in INTENTS.keys()}
+def _build_keyword_index():
+    # palabra clave simple -> intenciones ('cronograma' activa schedule y dates)
+    idx = {}
     for k, words in INTENTS.items():
-        if _has_any(body_lower, words):
+        for w in words:
+            if ' ' not in w:
+                idx.setdefault(w, []).append(k)
+    return idx
+
+_KEYWORD_TO_INTENTS = _build_keyword_index()
+# Una alternancia compilada por intención: un solo .search() en C en vez de N 'in'
+_INTENT_RES = {k: re.compile('|'.join(re.escape(w) for w in words)) for k, words in INTENTS.items()}
+
+def classify_intents(body_lower):
+    flags = dict.fromkeys(INTENTS, False)
+    for tok in body_lower.split():
+        for k in _KEYWORD_TO_INTENTS.get(tok, ()):
+            flags[k] = True
+    # Substring solo para las que faltan: frases ('me interesa'), plurales ('precios') o 'pdf?'
+    for k, rx in _INTENT_RES.items():
+        if not flags[k] and rx.search(body_lower):
             flags[k] = True
     # "precio X" sigue activando price
-    if re.search(r'precio\s+[a-záéíóúñ ]{3,}', body_lower):
+    if _PRECIO_RE.search(body_lower):
         flags['price'] = True
     # patrones claros de pago
-    if re.search(r'(como|cómo|donde|dónde)\s+pago', body_lower):
+    if _PAGO_RE.search(body_lower):
         flags['payment'] = True
     if 'metodo de pago' in body_lower or 'método de pago' in body_lower:
         flags['payment'] = True
@@ -281,45 +517,55 @@ def classify_intents(body_lower):
 
 # ===== FAQ por similitud =====
 def _faq_parse_blocks(faq_text):
+    # faq_text viene de la celda FAQ, ya recortada al cargar la hoja
     if not faq_text:
         return []
-    text = faq_text.strip()
-    pattern = re.compile(r"Si preguntan:\s*(.+?)\s*Respuesta:\s*(.+?)(?=(?:\n\s*Si preguntan:)|\Z)", re.S | re.I)
     blocks = []
-    for m in pattern.finditer(text):
+    for m in _FAQ_BLOCK_RE.finditer(faq_text):
         qpart = m.group(1).strip()
         ans = m.group(2).strip()
-        utterances = [u.strip(" \t\r\n.?!¡¿") for u in re.split(r"\s*/\s*|\n", qpart) if u.strip()]
+        utterances = [u.strip(" \t\r\n.?!¡¿") for u in _FAQ_UTTER_SPLIT_RE.split(qpart) if u.strip()]
         if utterances and ans:
             blocks.append((utterances, ans))
     return blocks
 
 def _faq_tokens(s):
     folded = _fold(s)
-    toks = [t for t in re.findall(r"[a-z0-9]+", folded) if len(t) >= 3 and t not in STOPWORDS_ES]
+    toks = [t for t in _FAQ_TOKEN_FINDALL(folded) if len(t) >= 3 and t not in STOPWORDS_ES]
     toks = [_normalize_token(t) for t in toks]
     return toks
 
+def _faq_prepare(faq_text):
+    """
+    Pre-tokeniza las frases FAQ una vez (al cargar la hoja).
+    Devuelve [(n_tokens, orden, tokens, respuesta)] ordenado por n_tokens ascendente.
+    """
+    items = []
+    for utterances, ans in _faq_parse_blocks(faq_text):
+        for u in utterances:
+            utok = frozenset(_faq_tokens(u))
+            if utok:
+                items.append((len(utok), len(items), utok, ans))
+    items.sort(key=lambda it: (it[0], it[1]))
+    return items
+
 def answer_from_faq(row, user_text):
-    faq_text = (row.get("FAQ") or "").strip()
-    if not faq_text:
-        return None
-    blocks = _faq_parse_blocks(faq_text)
-    if not blocks:
+    items = row.faq_items
+    if not items:
         return None
     qtok = set(_faq_tokens(user_text))
     if not qtok:
         return None
-    best_score, best_ans = 0.0, None
-    for utterances, ans in blocks:
-        for u in utterances:
-            utok = set(_faq_tokens(u))
-            if not utok:
-                continue
-            overlap = len(qtok & utok)
-            score = overlap / max(1, len(utok))
-            if score > best_score:
-                best_score, best_ans = score, ans
+    nq = len(qtok)
+    # score = overlap / n, comparado en enteros; ante empate gana la frase que aparece antes en la hoja
+    best_overlap, best_n, best_pos, best_ans = 0, 1, 0, None
+    for n, pos, utok, ans in items:
+        if nq * best_n < best_overlap * n:
+            break  # overlap <= nq: desde aquí ninguna frase puede igualar al mejor
+        overlap = len(qtok & utok)
+        if overlap * best_n > best_overlap * n or (best_ans is not None and overlap * best_n == best_overlap * n and pos < best_pos):
+            best_overlap, best_n, best_pos, best_ans = overlap, n, pos, ans
+    best_score = best_overlap / best_n
     if best_score >= 0.45 or (best_score >= 0.30 and len(qtok) >= 2):
         return 'Claro 😊 ' + best_ans
     return None
@@ -333,29 +579,28 @@ def answer_from_faq_global(rows, user_text):
 
 # ===== Respuestas =====
 def course_card(row, from_number, body_lower=''):
+    price_col = pick_price_column_from_text(body_lower, from_number)
+    card = row.cards.get(price_col)
+    if card is None:
+        # La fila es inmutable hasta el próximo refresco (que crea filas nuevas): se arma una vez por país
+        card = row.cards[price_col] = _render_course_card(row, price_col)
+    return card
+
+def _render_course_card(row, price_col):
     partes = []
     partes.append('Hola, gracias por contactarnos 🙌 Soy *{}* (asistente de {}).'.format(BOT_NAME, BRAND_NAME))
     partes.append('Te paso la información del curso:')
-    titulo = row.get('Curso', '')
-    if titulo: partes.append('🎓 *{}*'.format(titulo))
-    txt = row.get('Texto Principal', '')
-    if txt: partes.append(txt)
-    fi = row.get('Fecha de Inicio', '')
-    if fi: partes.append('📅 *Inicio:* {}'.format(fi))
-    fechas = row.get('Fechas de clases', '')
-    if fechas: partes.append('🗓️ *Fechas de clases:* {}'.format(fechas))
-    dur = row.get('Duración', '')
-    if dur: partes.append('⏳ *Duración:* {}'.format(dur))
-    hor = row.get('Horarios', '')
-    if hor: partes.append('🕒 *Horarios:* {}'.format(hor))
-    modalidad = row.get('Modalidad', '') or row.get('modalidad', '')
-    if modalidad: partes.append('🎥 *Modalidad:* {}'.format(modalidad))
-    metodologia = row.get('Metodología', '') or row.get('Metodologia', '') or row.get('metodología', '')
-    if metodologia: partes.append('🧩 *Metodología:* {}'.format(metodologia))
-    price_col = pick_price_column_from_text(body_lower, from_number)
-    precio = row.get(price_col, '') or row.get('Inscripción Resto Países', '')
-    if precio: partes.append('💳 *Inscripción ({}):* {}'.format(price_col.replace('Inscripción ', ''), precio))
-    pdf = row.get('Link PDF', '')
+    if row.curso: partes.append('🎓 *{}*'.format(row.curso))
+    if row.texto: partes.append(row.texto)
+    if row.fecha_inicio: partes.append('📅 *Inicio:* {}'.format(row.fecha_inicio))
+    if row.fechas_clases: partes.append('🗓️ *Fechas de clases:* {}'.format(row.fechas_clases))
+    if row.duracion: partes.append('⏳ *Duración:* {}'.format(row.duracion))
+    if row.horarios: partes.append('🕒 *Horarios:* {}'.format(row.horarios))
+    if row.modalidad: partes.append('🎥 *Modalidad:* {}'.format(row.modalidad))
+    if row.metodologia: partes.append('🧩 *Metodología:* {}'.format(row.metodologia))
+    precio = row.price(price_col)
+    if precio: partes.append('💳 *Inscripción ({}):* {}'.format(PRICE_LABELS[price_col], precio))
+    pdf = row.pdf
     if pdf: partes.append('📄 *PDF informativo:* {}'.format(pdf))  # aquí solo link; el adjunto se maneja en "brief/info"
     partes.append('Si deseas *inscribirte* o conocer *métodos de pago*, te conecto con un asesor humano 🤝\n📲 {}  ({})'.format(ADVISOR_E164, ADVISOR_WA_LINK))
     return '\n\n'.join(partes)
@@ -365,15 +610,23 @@ def course_brief_text(row):
     Solo texto breve (titulo + texto principal + (opcional) link PDF).
     El adjunto PDF se añade en el webhook con build_twiml(media_url=pdf).
     """
-    titulo = (row.get('Curso') or '').strip()
-    txt = (row.get('Texto Principal') or '').strip()
-    pdf = (row.get('Link PDF') or '').strip()
+    titulo, txt, pdf = row.curso, row.texto, row.pdf
     partes = []
     if titulo: partes.append('🎓 *{}*'.format(titulo))
     if txt: partes.append(txt)
     if pdf: partes.append('📄 {}'.format(pdf))  # mantenemos el link como respaldo
     return '\n\n'.join([p for p in partes if p]) or 'No encontré información del curso.'
 
+# (intención, atributo de CourseRow, plantilla, texto si la celda está vacía); en orden de respuesta
+_INTENT_FIELDS = (
+    ('schedule', 'horarios', '🕒 *Horarios:* {}', None),
+    ('modality', 'modalidad', '🎥 *Modalidad:* {}', '🎥 Modalidad en vivo por videoconferencia (clases síncronas).'),
+    ('methodology', 'metodologia', '🧩 *Metodología:* {}', None),
+    ('start', 'fecha_inicio', '📅 *Inicio:* {}', None),
+    ('dates', 'fechas_clases', '🗓️ *Fechas de clases:* {}', None),
+    ('duration', 'duracion', '⏳ *Duración:* {}', None),
+)
+
 def answer_for_intents(row, intents, body_lower, from_number):
     """
     Devuelve solo TEXTO. Los adjuntos (PDF/audio) se resuelven en el webhook
@@ -382,36 +635,23 @@ def answer_for_intents(row, intents, body_lower, from_number):
     answers = []
     if intents.get('price'):
         col = pick_price_column_from_text(body_lower, from_number)
-        precio = row.get(col, '') or row.get('Inscripción Resto Países', '')
+        precio = row.price(col)
         if precio:
-            answers.append('💳 *Inscripción ({}):* {}'.format(col.replace('Inscripción ', ''), precio))
+            answers.append('💳 *Inscripción ({}):* {}'.format(PRICE_LABELS[col], precio))
         else:
             answers.append('💳 Para darte el valor exacto, indícame tu país (ej.: "precio Bolivia").')
-    if intents.get('schedule'):
-        val = (row.get('Horarios') or '').strip()
-        if val: answers.append('🕒 *Horarios:* {}'.format(val))
-    if intents.get('modality'):
-        val = (row.get('Modalidad') or row.get('modalidad') or '').strip()
-        if val: answers.append('🎥 *Modalidad:* {}'.format(val))
-        else:   answers.append('🎥 Modalidad en vivo por videoconferencia (clases síncronas).')
-    if intents.get('methodology'):
-        val = (row.get('Metodología') or row.get('Metodologia') or row.get('metodología') or '').strip()
-        if val: answers.append('🧩 *Metodología:* {}'.format(val))
-    if intents.get('start'):
-        val = (row.get('Fecha de Inicio') or '').strip()
-        if val: answers.append('📅 *Inicio:* {}'.format(val))
-    if intents.get('dates'):
-        val = (row.get('Fechas de clases') or '').strip()
-        if val: answers.append('🗓️ *Fechas de clases:* {}'.format(val))
-    if intents.get('duration'):
-        val = (row.get('Duración') or '').strip()
-        if val: answers.append('⏳ *Duración:* {}'.format(val))
+    for key, attr, tmpl, default in _INTENT_FIELDS:
+        if not intents.get(key):
+            continue
+        val = getattr(row, attr)
+        if val: answers.append(tmpl.format(val))
+        elif default: answers.append(default)
     if intents.get('recordings') and not answers:
         faq_ans = answer_from_faq(row, body_lower)
         if faq_ans: answers.append(faq_ans)
         else:       answers.append('Sí 😊 Las clases quedan grabadas para que puedas verlas luego.')
     if intents.get('faq') and not answers:
-        faq = (row.get('FAQ') or '').strip()
+        faq = row.faq
         if faq: answers.append('ℹ️ *FAQ:* {}'.format(faq))
     if intents.get('info') and not answers:
         # En info el adjunto PDF se maneja fuera
@@ -422,15 +662,10 @@ def answer_for_intents(row, intents, body_lower, from_number):
     return '\n\n'.join([a for a in answers if a])
 
 # ===== Handoff / mensajes asesor =====
-def detect_intent_enroll(body_lower):
-    keys = ['me interesa','quiero inscribirme','inscribirme','como me inscribo','cómo me inscribo','quiero anotarme','quiero matricularme']
-    return any(k in body_lower for k in keys)
-
 def send_admin_forward(user_from, user_body, course_name=None):
-    if not (TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_WHATSAPP_NUMBER and ADMIN_FORWARD_NUMBER):
+    if not _TW_OK:
         return False
     try:
-        url = 'https://api.twilio.com/2010-04-01/Accounts/{}/Messages.json'.format(TWILIO_ACCOUNT_SID)
         parts = [
             'Nuevo lead para {}'.format(BRAND_NAME),
             'Desde: {}'.format(user_from),
@@ -439,8 +674,9 @@ def send_admin_forward(user_from, user_body, course_name=None):
         if course_name:
             parts.append('Curso: {}'.format(course_name))
         data = {'From': TWILIO_WHATSAPP_NUMBER, 'To': ADMIN_FORWARD_NUMBER, 'Body': '\n'.join(parts)}
-        resp = requests.post(url, data=data, auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN), timeout=15)
+        resp = _http.post(_TW_URL, data=data, auth=_TW_AUTH, timeout=15)
         resp.raise_for_status()
+        print('[LEAD FORWARDED]', user_from, course_name)
         return True
     except Exception as e:
         print('[ERROR send_admin_forward]', e)
@@ -448,17 +684,16 @@ def send_admin_forward(user_from, user_body, course_name=None):
 
 def send_media_to_user(to_number, media_url, body_text=""):
     """Envío saliente (proactivo) con MediaUrl por REST."""
-    if not (TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_WHATSAPP_NUMBER):
+    if not _TW_SEND_OK:
         return False
     try:
-        url = f"https://api.twilio.com/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}/Messages.json"
         data = {
             "From": TWILIO_WHATSAPP_NUMBER,
             "To": to_number,
             "Body": body_text,
             "MediaUrl": media_url
         }
-        resp = requests.post(url, data=data, auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN), timeout=15)
+        resp = _http.post(_TW_URL, data=data, auth=_TW_AUTH, timeout=15)
         resp.raise_for_status()
         return True
     except Exception as e:
@@ -471,6 +706,9 @@ def advisor_message():
         '📲 {}  ({})'
     ).format(ADVISOR_E164, ADVISOR_WA_LINK)
 
+_ADVISOR_TWIML = twiml_bytes(advisor_message())
+_ERROR_TWIML = twiml_bytes('Ups, tuve un detalle al procesar tu mensaje. ¿Puedes intentar de nuevo? 🙏')
+
 # ===== NUEVO: detección de audio (Twilio Media) y curso no disponible =====
 COURSE_KEYWORDS = [
     'curso','certificacion','certificación','programa','diplomado','especializacion','especialización',
@@ -491,54 +729,86 @@ def is_audio_message(req_values):
             return True
     return False
 
+_AUDIO_TWIML = twiml_bytes(
+    'Lamentablemente no puedo responder a *audios* 🙈.\n'
+    'Si tienes una consulta específica, puedes contactarte con uno de nuestros coordinadores y te ayuda al toque:\n\n'
+    f'📲 {ADVISOR_E164}  ({ADVISOR_WA_LINK})'
+)
+
 def audio_reply():
-    return build_twiml(
-        'Lamentablemente no puedo responder a *audios* 🙈.\n'
-        'Si tienes una consulta específica, puedes contactarte con uno de nuestros coordinadores y te ayuda al toque:\n\n'
-        f'📲 {ADVISOR_E164}  ({ADVISOR_WA_LINK})'
-    )
+    return xml_response(_AUDIO_TWIML)
 
-def unavailable_course_reply(rows):
-    cursos = list_courses(rows)
-    lista = '\n- ' + '\n- '.join(cursos) if cursos else ''
-    return build_twiml(
+def _menu_replies(cursos):
+    """
+    Respuestas que solo dependen de la lista de cursos (saludo, fallback, curso no disponible).
+    Se arman como TwiML una vez por refresco de la hoja.
+    """
+    bullets = '\n- '.join(cursos)
+    if cursos:
+        greeting = (
+            'Hola, gracias por contactarnos 🙌 Soy *{}*.\n'
+            'Indícame el *nombre del curso* del que deseas información y te paso los detalles.\n\n'
+            '*Cursos:*\n- '.format(BOT_NAME)
+        ) + bullets
+        fallback = 'Para ayudarte mejor, dime el *nombre del curso*.\n\n*Cursos:*\n- ' + bullets
+    else:
+        greeting = 'Hola, gracias por contactarnos 🙌 Soy *{}*. Aún no encuentro cursos publicados.'.format(BOT_NAME)
+        fallback = 'Por ahora no encuentro cursos publicados en {}.'.format(BRAND_NAME)
+    unavailable = (
         'Lamentablemente *ese curso* no lo tengo aún disponible 😔.\n'
         'Puedes contactar a uno de nuestros coordinadores para brindarte información más precisa:\n\n'
         f'📲 {ADVISOR_E164}  ({ADVISOR_WA_LINK})'
-        + (f'\n\n*Cursos disponibles:*\n{lista}' if cursos else '')
+        + (f'\n\n*Cursos disponibles:*\n\n- {bullets}' if cursos else '')
     )
+    return {
+        'greeting': twiml_bytes(greeting),
+        'fallback': twiml_bytes(fallback),
+        'unavailable': twiml_bytes(unavailable),
+    }
+
+# Cache vacío hasta la primera carga; va aquí porque _build_cache necesita _menu_replies
+_cache = _build_cache([], 0.0)
+
+def unavailable_course_reply():
+    return xml_response(_cache['menus']['unavailable'])
 
 def probably_course_request(text_fold):
     return any(k in text_fold for k in COURSE_KEYWORDS)
 
 # ===== Sesiones =====
 def set_session_course(from_number, row):
-    _sessions[from_number] = {'course': row, 't': time.time()}
+    with _lock:
+        _sessions[from_number] = {'course': row, 't': time.time()}
 
 def get_session_course(from_number):
     sess = _sessions.get(from_number)
     if not sess:
         return None
     if time.time() - sess.get('t', 0) > SESSION_TTL:
-        _sessions.pop(from_number, None)
+        with _lock:
+            _sessions.pop(from_number, None)
         return None
     return sess.get('course')
 
 # ===== Rutas =====
 @app.get('/health')
 def health():
-    age = int(time.time() - _cache['t']) if _cache['t'] else None
-    return jsonify(ok=True, brand=BRAND_NAME, bot=BOT_NAME, cached_rows=len(_cache['rows']), cache_age_s=age)
+    c = _cache
+    age = int(time.time() - c['t']) if c['t'] else None
+    return jsonify(ok=True, brand=BRAND_NAME, bot=BOT_NAME, cached_rows=len(c['rows']), cache_age_s=age)
 
 @app.route('/sheet_refresh', methods=['GET','POST'])
 def sheet_refresh():
-    fetch_sheet_rows(force=True)
-    return jsonify(ok=True, refreshed=True, count=len(_cache['rows']))
+    rows = fetch_sheet_rows(force=True)
+    return jsonify(ok=True, refreshed=True, count=len(rows))
 
 @app.get('/sheet_preview')
 def sheet_preview():
     try:
         rows = fetch_sheet_rows()
+        c = _cache
+        if rows is c['rows']:
+            return Response(c['preview_json'], mimetype='application/json')
         return jsonify(ok=True, count=len(rows), cursos=list_courses(rows))
     except Exception as e:
         return jsonify(ok=False, error=str(e)), 500
@@ -553,17 +823,25 @@ def whatsapp_webhook():
 
         rows = fetch_sheet_rows()
         body_fold = _fold(body)
+        body_words = _query_words(body_fold)
 
         # 0) Si es audio entrante, responde fijo
         if is_audio_message(request.values):
             return audio_reply()
 
+        # Un solo escaneo de palabras clave por mensaje; lo reutilizan todos los pasos
+        intents = classify_intents(body_fold)
+
         # 1) Intento de inscripción explícito
-        if detect_intent_enroll(body_fold):
-            row_for_forward = find_course(rows, body) or get_session_course(from_number)
-            course_name = row_for_forward.get('Curso') if row_for_forward else None
-            sent = send_admin_forward(from_number, body, course_name=course_name)
-            human = 'Ya avisé a nuestro asesor ✅.' if sent else 'Te conecto con nuestro asesor.'
+        if intents['enroll']:
+            row_for_forward = find_course(rows, body_fold, body_words) or get_session_course(from_number)
+            course_name = row_for_forward.curso if row_for_forward else None
+            # El aviso al asesor sale en segundo plano; no esperamos a Twilio para responder
+            if _TW_OK:
+                _EXEC.submit(send_admin_forward, from_number, body, course_name)
+                human = 'Ya avisé a nuestro asesor ✅.'
+            else:
+                human = 'Te conecto con nuestro asesor.'
             reply = (
                 '¡Genial! 🙌 {} En breve te escribirá.\n\n'
                 'Si prefieres, contáctalo ahora:\n'
@@ -573,27 +851,26 @@ def whatsapp_webhook():
             # Enviar audio opcional (por REST) con modalidad/metodología
             audio_url = ''
             if row_for_forward:
-                audio_url = (row_for_forward.get('Audio') or '').strip()
+                audio_url = row_for_forward.audio
             if not audio_url:
                 audio_url = AUDIO_URL
             if audio_url:
-                send_media_to_user(from_number, audio_url, "Te dejo un audio breve sobre modalidad y metodología 🎧")
+                _EXEC.submit(send_media_to_user, from_number, audio_url, "Te dejo un audio breve sobre modalidad y metodología 🎧")
 
             return build_twiml(reply)
 
         # 2) ¿mencionó curso?
-        row_direct = find_course(rows, body) if body else None
+        row_direct = find_course(rows, body_fold, body_words) if body else None
         if row_direct:
             set_session_course(from_number, row_direct)
-            intents = classify_intents(body_fold)
 
             # Pago → derivar
             if intents.get('payment'):
-                return build_twiml(advisor_message())
+                return xml_response(_ADVISOR_TWIML)
 
             # PDF solicitado explícitamente → adjuntar
             if intents.get('pdf'):
-                pdf_url = (row_direct.get('Link PDF') or '').strip()
+                pdf_url = row_direct.pdf
                 if pdf_url:
                     # texto + adjunto PDF
                     return build_twiml("Te dejo el PDF informativo 📄", media_url=pdf_url)
@@ -610,7 +887,7 @@ def whatsapp_webhook():
             )
             if generic_info:
                 text = course_brief_text(row_direct)
-                pdf_url = (row_direct.get('Link PDF') or '').strip()
+                pdf_url = row_direct.pdf
                 if pdf_url:
                     return build_twiml(text, media_url=pdf_url)
                 return build_twiml(text)
@@ -630,23 +907,11 @@ def whatsapp_webhook():
 
         # 3) Saludo sin curso
         if not body or body_fold in GREETINGS or any(body_fold.startswith(g) for g in GREETINGS):
-            cursos = list_courses(rows)
-            if cursos:
-                msg = (
-                    'Hola, gracias por contactarnos 🙌 Soy *{}*.\n'
-                    'Indícame el *nombre del curso* del que deseas información y te paso los detalles.\n\n'
-                    '*Cursos:*\n- '.format(BOT_NAME)
-                ) + '\n- '.join(cursos)
-            else:
-                msg = 'Hola, gracias por contactarnos 🙌 Soy *{}*. Aún no encuentro cursos publicados.'.format(BOT_NAME)
-            return build_twiml(msg)
-
-        # 3.1 Clasifica intenciones (necesario antes de otros pasos)
-        intents = classify_intents(body_fold)
+            return xml_response(_cache['menus']['greeting'])
 
         # Métodos de pago sin curso → derivar igual
         if intents.get('payment'):
-            return build_twiml(advisor_message())
+            return xml_response(_ADVISOR_TWIML)
 
         # Caso 1 curso: soportar "info" y "precio"
         if len(rows) == 1:
@@ -654,7 +919,7 @@ def whatsapp_webhook():
             if _has_any(body_fold, ['info','informacion','información','info del curso']):
                 set_session_course(from_number, only)
                 text = course_brief_text(only)
-                pdf_url = (only.get('Link PDF') or '').strip()
+                pdf_url = only.pdf
                 if pdf_url:
                     return build_twiml(text, media_url=pdf_url)
                 return build_twiml(text)
@@ -666,7 +931,7 @@ def whatsapp_webhook():
 
         # Parece pedir un curso/tema y NO existe → “no disponible”
         if probably_course_request(body_fold):
-            return unavailable_course_reply(rows)
+            return unavailable_course_reply()
 
         # 4) FAQ global
         faq_any = answer_from_faq_global(rows, body_fold)
@@ -678,11 +943,11 @@ def whatsapp_webhook():
         if row_ctx:
             # Métodos de pago con curso → derivar
             if intents.get('payment'):
-                return build_twiml(advisor_message())
+                return xml_response(_ADVISOR_TWIML)
 
             # PDF explícito con contexto → adjuntar
             if intents.get('pdf'):
-                pdf_url = (row_ctx.get('Link PDF') or '').strip()
+                pdf_url = row_ctx.pdf
                 if pdf_url:
                     return build_twiml("Te dejo el PDF informativo 📄", media_url=pdf_url)
 
@@ -696,7 +961,7 @@ def whatsapp_webhook():
 
             if intents.get('info'):
                 text = course_brief_text(row_ctx)
-                pdf_url = (row_ctx.get('Link PDF') or '').strip()
+                pdf_url = row_ctx.pdf
                 if pdf_url:
                     return build_twiml(text, media_url=pdf_url)
                 return build_twiml(text)
@@ -718,14 +983,12 @@ def whatsapp_webhook():
             return build_twiml(msg)
 
         # 7) Fallback
-        cursos = list_courses(rows)
-        if cursos:
-            return build_twiml('Para ayudarte mejor, dime el *nombre del curso*.\n\n*Cursos:*\n- ' + '\n- '.join(cursos))
-        return build_twiml('Por ahora no encuentro cursos publicados en {}.'.format(BRAND_NAME))
+        return xml_response(_cache['menus']['fallback'])
 
     except Exception as e:
         print('[ERROR /whatsapp]', e)
-        return build_twiml('Ups, tuve un detalle al procesar tu mensaje. ¿Puedes intentar de nuevo? 🙏')
+        return xml_response(_ERROR_TWIML)
 
+# Solo desarrollo local; en producción corre con gunicorn (ver Procfile)
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=int(os.getenv('PORT', 8080)))